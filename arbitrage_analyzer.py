@@ -3,50 +3,223 @@ MARA Hackathon Arbitrage Analyzer
 Analyzes pricing data to find optimal compute allocation strategies
 """
 
-import pandas as pd
 import numpy as np
 import sqlite3
+import math
+import time
 from datetime import datetime, timedelta
 import json
-import requests
 import os
 from dotenv import load_dotenv
 
+# pandas, requests and numba are imported on first use so that computing an
+# allocation from known prices does not pay for them at import time
+
 load_dotenv()
 
 API_BASE_URL = os.getenv('API_BASE_URL', 'https://mara-hackathon-api.onrender.com')
 API_KEY = os.getenv('API_KEY')
 
+# Shared keep-alive session for API fallbacks; (connect, read) timeout in seconds
+REQUEST_TIMEOUT = (2, 5)
+_SESSION = None
+
+
+def _session():
+    """Return the shared requests session, creating it on first use"""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        _SESSION = requests.Session()
+        _SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        _SESSION.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return _SESSION
+
+PRICE_COLUMNS = ('energy_price', 'hash_price', 'token_price')
+
+# Window start is always a bound parameter, so identical SQL text lets sqlite3
+# reuse its cached prepared statements across calls
+PRICING_STATS_QUERY = f"""
+    SELECT COUNT(*), {', '.join(f'AVG({c}), AVG({c} * {c}), MIN({c}), MAX({c})' for c in PRICE_COLUMNS)}
+    FROM pricing
+    WHERE collected_at >= ?
+"""
+
+PRICING_CURRENT_QUERY = f"""
+    SELECT {', '.join(PRICE_COLUMNS)} FROM pricing
+    WHERE collected_at >= ?
+    ORDER BY collected_at DESC
+    LIMIT 1
+"""
+
+PRICING_COLUMNS_QUERY = f"""
+    SELECT {', '.join(PRICE_COLUMNS)} FROM pricing
+    WHERE collected_at >= ?
+    ORDER BY collected_at
+"""
+
+PRICING_SIMULATION_QUERY = f"""
+    SELECT timestamp, {', '.join(PRICE_COLUMNS)} FROM pricing
+    WHERE collected_at >= ?
+    ORDER BY collected_at
+"""
+
+# Upper bound on how long cached prices are reused when they came from the API
+PRICES_CACHE_TTL = 60
+
+
+def _simulate_kernel(powers, rev_coeff, kinds, energy, hash_p, token_p, power_limit):
+    """Greedy allocation for each of T price rows, returning (profit, revenue, cost)"""
+    n_rows = energy.shape[0]
+    n_machines = powers.shape[0]
+    profit = np.zeros(n_rows)
+    revenue = np.zeros(n_rows)
+    cost = np.zeros(n_rows)
+    
+    for t in prange(n_rows):
+        revenue_per_watt = np.empty(n_machines)
+        profit_per_watt = np.empty(n_machines)
+        order = np.empty(n_machines, dtype=np.int64)
+        
+        # Insertion sort by profit per watt (descending, stable); there are only a few machine types
+        for m in range(n_machines):
+            price = hash_p[t] if kinds[m] == 0 else token_p[t]
+            revenue_per_watt[m] = rev_coeff[m] * price
+            profit_per_watt[m] = revenue_per_watt[m] - energy[t]
+            j = m
+            while j > 0 and profit_per_watt[order[j - 1]] < profit_per_watt[m]:
+                order[j] = order[j - 1]
+                j -= 1
+            order[j] = m
+            
+        remaining_power = power_limit
+        for r in range(n_machines):
+            m = order[r]
+            # Branchless: unprofitable machines get zero units
+            power_used = (profit_per_watt[m] > 0) * (remaining_power // powers[m]) * powers[m]
+            remaining_power -= power_used
+            profit[t] += power_used * profit_per_watt[m]
+            revenue[t] += power_used * revenue_per_watt[m]
+            cost[t] += power_used * energy[t]
+            
+    return profit, revenue, cost
+
+
+prange = range  # Rebound to numba.prange before compiling
+_compiled_kernel = False  # Not built yet; None once numba turned out to be unavailable
+
+
+def _get_simulate_kernel():
+    """Compile _simulate_kernel with numba on first use, or None if numba is not installed"""
+    global _compiled_kernel, prange
+    if _compiled_kernel is False:
+        try:
+            import numba
+        except ImportError:  # numba is optional; simulations fall back to plain numpy
+            _compiled_kernel = None
+        else:
+            prange = numba.prange
+            _compiled_kernel = numba.njit(parallel=True, fastmath=True, cache=True)(_simulate_kernel)
+    return _compiled_kernel
+
 class ArbitrageAnalyzer:
     def __init__(self, db_path='mara_data.db'):
         self.db_path = db_path
+        
+        # Keep a single connection open instead of reconnecting on every call
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._refresh_tables()
+        
+        # Latest prices, keyed on SQLite's data_version (bumped on every external commit)
+        self._prices_cache = None
+        self._prices_cache_version = None
+        self._prices_cache_time = 0.0
+        
         self.inventory = self.load_inventory()
         self.site_power_limit = 1000000  # Default 1MW
+        self._build_machine_arrays()
+        
+    def _build_machine_arrays(self):
+        """Flatten the inventory into parallel arrays (one entry per machine type)"""
+        self._types = []
+        self._subtypes = []
+        powers, caps, kinds = [], [], []
+        
+        for miner_type, specs in self.inventory['miners'].items():
+            self._types.append('miner')
+            self._subtypes.append(miner_type)
+            powers.append(specs['power'])
+            caps.append(specs['hashrate'])
+            kinds.append(0)  # Paid at hash_price
+            
+        for compute_type, specs in self.inventory['inference'].items():
+            self._types.append('inference')
+            self._subtypes.append(compute_type)
+            powers.append(specs['power'])
+            caps.append(specs['tokens'])
+            kinds.append(1)  # Paid at token_price
+            
+        self._powers = np.array(powers, dtype=np.int64)
+        self._caps = np.array(caps, dtype=np.float64)
+        self._kinds = np.array(kinds, dtype=np.int8)
+        
+        # Price-independent terms, hoisted out of the per-call allocation math
+        self._rev_coeff = self._caps / self._powers
+        
+        # Within one kind profit per watt is rev_coeff * price - energy, so which machine
+        # wins only depends on the sign of the price. Resolve the winner for
+        # price < 0, == 0 and > 0 once, turning the single-kind strategies into closed forms.
+        self._miner_picks = self._sign_picks(np.flatnonzero(self._kinds == 0))
+        self._inference_picks = self._sign_picks(np.flatnonzero(self._kinds == 1))
+        
+    def _sign_picks(self, idx):
+        """Best machine among idx for a negative, zero and positive unit price"""
+        if len(idx) == 0:
+            return None
+        coeff = self._rev_coeff[idx]
+        return np.array([idx[coeff.argmin()], idx[0], idx[coeff.argmax()]])
+        
+    def _refresh_tables(self):
+        """Re-read the set of existing tables from sqlite_master"""
+        self._tables = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if 'pricing' in self._tables:
+            # Current collectors key pricing on collected_at; older databases need an index
+            # so range scans on it use a B-tree seek instead of a full table scan
+            key = [row[1] for row in self._conn.execute("PRAGMA table_info(pricing)") if row[5]]
+            if key != ['collected_at']:
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pricing_collected_at ON pricing(collected_at)")
+                self._conn.commit()
+            
+    def _has_table(self, name):
+        """Check for a table, only hitting sqlite_master while it is still missing
+        (the collector may create it after the analyzer started)"""
+        if name not in self._tables:
+            self._refresh_tables()
+        return name in self._tables
+        
+    def _data_version(self):
+        """Return a counter that changes whenever another connection commits"""
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
         
     def load_inventory(self):
         """Load inventory from database or API"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Check if inventory table exists
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='inventory'")
-            if not cursor.fetchone():
-                conn.close()
+            if not self._has_table('inventory'):
                 # Table doesn't exist, fetch from API
-                response = requests.get(f"{API_BASE_URL}/inventory")
+                response = _session().get(f"{API_BASE_URL}/inventory", timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     return response.json()
                 else:
                     raise Exception(f"Failed to fetch inventory from API: {response.status_code}")
             
             # Try to load from database
-            df = pd.read_sql_query("SELECT * FROM inventory", conn)
-            conn.close()
+            rows = self._conn.execute("SELECT type, subtype, power, capability FROM inventory").fetchall()
             
-            if df.empty:
+            if not rows:
                 # Fetch from API if no data in database
-                response = requests.get(f"{API_BASE_URL}/inventory")
+                response = _session().get(f"{API_BASE_URL}/inventory", timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     return response.json()
                 else:
@@ -54,23 +227,23 @@ class ArbitrageAnalyzer:
             else:
                 # Convert database format to API format
                 inventory = {'miners': {}, 'inference': {}}
-                for _, row in df.iterrows():
-                    if row['type'] == 'miner':
-                        inventory['miners'][row['subtype']] = {
-                            'power': row['power'],
-                            'hashrate': row['capability']
+                for machine_type, subtype, power, capability in rows:
+                    if machine_type == 'miner':
+                        inventory['miners'][subtype] = {
+                            'power': power,
+                            'hashrate': capability
                         }
                     else:
-                        inventory['inference'][row['subtype']] = {
-                            'power': row['power'],
-                            'tokens': row['capability']
+                        inventory['inference'][subtype] = {
+                            'power': power,
+                            'tokens': capability
                         }
                 return inventory
                 
         except Exception as e:
             # If all else fails, fetch from API
             print(f"Warning: {e}")
-            response = requests.get(f"{API_BASE_URL}/inventory")
+            response = _session().get(f"{API_BASE_URL}/inventory", timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -90,16 +263,24 @@ class ArbitrageAnalyzer:
             
     def get_latest_prices(self):
         """Get the most recent pricing data"""
+        version = self._data_version()
+        now = time.monotonic()
+        if (self._prices_cache is not None and self._prices_cache_version == version
+                and now - self._prices_cache_time < PRICES_CACHE_TTL):
+            return self._prices_cache
+            
+        prices = self._fetch_latest_prices()
+        self._prices_cache = prices
+        self._prices_cache_version = version
+        self._prices_cache_time = now
+        return prices
+        
+    def _fetch_latest_prices(self):
+        """Read the most recent pricing data from the database or API"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Check if pricing table exists
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pricing'")
-            if not cursor.fetchone():
-                conn.close()
+            if not self._has_table('pricing'):
                 # Table doesn't exist, fetch from API
-                response = requests.get(f"{API_BASE_URL}/prices")
+                response = _session().get(f"{API_BASE_URL}/prices", timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     prices = response.json()
                     if prices:
@@ -107,28 +288,30 @@ class ArbitrageAnalyzer:
                 else:
                     raise Exception(f"Failed to fetch prices from API: {response.status_code}")
             
-            query = """
-                SELECT * FROM pricing 
-                ORDER BY collected_at DESC 
+            # Plain cursor fetch; a one-row DataFrame is pure overhead here
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            row = cursor.execute("""
+                SELECT timestamp, energy_price, hash_price, token_price, collected_at
+                FROM pricing
+                ORDER BY collected_at DESC
                 LIMIT 1
-            """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            """).fetchone()
             
-            if df.empty:
+            if row is None:
                 # Fetch from API if no data
-                response = requests.get(f"{API_BASE_URL}/prices")
+                response = _session().get(f"{API_BASE_URL}/prices", timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     prices = response.json()
                     if prices:
                         return prices[0]
             else:
-                return df.iloc[0].to_dict()
+                return dict(row)
                 
         except Exception as e:
             # If all else fails, fetch from API
             print(f"Warning: {e}")
-            response = requests.get(f"{API_BASE_URL}/prices")
+            response = _session().get(f"{API_BASE_URL}/prices", timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
                 prices = response.json()
                 if prices:
@@ -164,78 +347,59 @@ class ArbitrageAnalyzer:
             'power_used': power_per_unit * quantity
         }
         
-    def find_optimal_allocation(self, current_prices=None):
-        """Find the optimal allocation of machines given current prices"""
+    def find_optimal_allocation(self, current_prices=None, timestamp=None):
+        """Find the optimal allocation of machines given current prices.
+        
+        Pass timestamp when calling in a loop (e.g. the row's collected_at) to
+        skip formatting the wall clock on every call.
+        """
         if current_prices is None:
             current_prices = self.get_latest_prices()
             
-        # Calculate profit per watt for each machine type
-        machine_efficiency = []
+        # Profit per watt for every machine type in one vectorized pass
+        unit_price = np.where(self._kinds == 0, current_prices['hash_price'], current_prices['token_price'])
+        revenue_per_watt = self._rev_coeff * unit_price
+        profit_per_watt = revenue_per_watt - current_prices['energy_price']
         
-        # Analyze miners
-        for miner_type, specs in self.inventory['miners'].items():
-            revenue_per_watt = (specs['hashrate'] * current_prices['hash_price']) / specs['power']
-            cost_per_watt = current_prices['energy_price']
-            profit_per_watt = revenue_per_watt - cost_per_watt
-            
-            machine_efficiency.append({
-                'type': 'miner',
-                'subtype': miner_type,
-                'power': specs['power'],
-                'profit_per_watt': profit_per_watt,
-                'revenue_per_watt': revenue_per_watt,
-                'capability': specs['hashrate'],
-                'price_type': 'hash_price'
-            })
-            
-        # Analyze inference
-        for compute_type, specs in self.inventory['inference'].items():
-            revenue_per_watt = (specs['tokens'] * current_prices['token_price']) / specs['power']
-            cost_per_watt = current_prices['energy_price']
-            profit_per_watt = revenue_per_watt - cost_per_watt
-            
-            machine_efficiency.append({
-                'type': 'inference',
-                'subtype': compute_type,
-                'power': specs['power'],
-                'profit_per_watt': profit_per_watt,
-                'revenue_per_watt': revenue_per_watt,
-                'capability': specs['tokens'],
-                'price_type': 'token_price'
-            })
-            
-        # Sort by profit per watt (descending)
-        machine_efficiency.sort(key=lambda x: x['profit_per_watt'], reverse=True)
+        # Greedy allocation based on profit per watt (descending), worked on arrays in
+        # sorted order. Unprofitable machines sort last and are zeroed by the mask
+        # rather than branched around.
+        order = np.argsort(-profit_per_watt, kind='stable')
+        profit_per_watt = profit_per_watt[order]
+        revenue_per_watt = revenue_per_watt[order]
+        powers = self._powers[order]
+        profitable = profit_per_watt > 0
         
-        # Greedy allocation based on profit per watt
-        allocation = {}
+        # Each machine takes all it can of what the previous ones left:
+        # units[r] = (limit - sum(units[:r] * powers[:r])) // powers[r]
+        units = []
         remaining_power = self.site_power_limit
-        total_profit = 0
-        total_revenue = 0
-        total_cost = 0
+        for power, fits in zip(powers.tolist(), profitable.tolist()):
+            n_units = fits * (remaining_power // power)
+            units.append(n_units)
+            remaining_power -= n_units * power
+            
+        power_used = np.array(units, dtype=np.int64) * powers
+        profit = np.where(profitable, power_used * profit_per_watt, 0.0)
+        revenue = power_used * revenue_per_watt
+        cost = power_used * current_prices['energy_price']
+        total_profit = float(profit.sum())
+        total_revenue = float(revenue.sum())
+        total_cost = float(cost.sum())
         
-        for machine in machine_efficiency:
-            if machine['profit_per_watt'] <= 0:
-                continue  # Skip unprofitable machines
-                
-            # Calculate how many units we can fit
-            max_units = remaining_power // machine['power']
-            if max_units > 0:
-                allocation[f"{machine['subtype']}_{machine['type']}"] = {
-                    'units': max_units,
-                    'type': machine['type'],
-                    'subtype': machine['subtype'],
-                    'power_used': max_units * machine['power'],
-                    'profit': max_units * machine['power'] * machine['profit_per_watt'],
-                    'revenue': max_units * machine['power'] * machine['revenue_per_watt'],
-                    'cost': max_units * machine['power'] * current_prices['energy_price']
+        allocation = {}
+        for r, i in enumerate(order.tolist()):
+            if units[r] > 0:
+                allocation[f"{self._subtypes[i]}_{self._types[i]}"] = {
+                    'units': units[r],
+                    'type': self._types[i],
+                    'subtype': self._subtypes[i],
+                    'power_used': int(power_used[r]),
+                    'profit': float(profit[r]),
+                    'revenue': float(revenue[r]),
+                    'cost': float(cost[r])
                 }
                 
-                remaining_power -= max_units * machine['power']
-                total_profit += allocation[f"{machine['subtype']}_{machine['type']}"]['profit']
-                total_revenue += allocation[f"{machine['subtype']}_{machine['type']}"]['revenue']
-                total_cost += allocation[f"{machine['subtype']}_{machine['type']}"]['cost']
-                
         return {
             'allocation': allocation,
             'total_power_used': self.site_power_limit - remaining_power,
@@ -244,187 +408,170 @@ class ArbitrageAnalyzer:
             'total_cost': total_cost,
             'roi_percentage': (total_profit / total_cost * 100) if total_cost > 0 else 0,
             'prices': current_prices,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp if timestamp is not None else datetime.now().isoformat()
         }
         
-    def analyze_price_trends(self, hours=24):
+    def analyze_price_trends(self, hours=24, with_correlations=True):
         """Analyze price trends over a specified period"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Check if pricing table exists
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pricing'")
-            if not cursor.fetchone():
-                conn.close()
+            if not self._has_table('pricing'):
                 return None
             
-            # Get data for the last N hours
+            # Mean/min/max and sums of squares are aggregated by SQLite in one row
             since = (datetime.now() - timedelta(hours=hours)).isoformat()
-            query = f"""
-                SELECT * FROM pricing 
-                WHERE collected_at >= '{since}'
-                ORDER BY collected_at
-            """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            summary = self._conn.execute(PRICING_STATS_QUERY, (since,)).fetchone()
+            data_points = summary[0]
             
-            if df.empty:
+            if data_points == 0:
                 return None
+                
+            current = self._conn.execute(PRICING_CURRENT_QUERY, (since,)).fetchone()
+            
+            # Correlations still need the raw series
+            if with_correlations:
+                prices = np.asarray(self._conn.execute(PRICING_COLUMNS_QUERY, (since,)).fetchall(),
+                                    dtype=np.float64)
         except Exception as e:
             print(f"Error analyzing price trends: {e}")
             return None
             
         # Calculate statistics
-        stats = {
-            'energy_price': {
-                'mean': df['energy_price'].mean(),
-                'std': df['energy_price'].std(),
-                'min': df['energy_price'].min(),
-                'max': df['energy_price'].max(),
-                'current': df['energy_price'].iloc[-1]
-            },
-            'hash_price': {
-                'mean': df['hash_price'].mean(),
-                'std': df['hash_price'].std(),
-                'min': df['hash_price'].min(),
-                'max': df['hash_price'].max(),
-                'current': df['hash_price'].iloc[-1]
-            },
-            'token_price': {
-                'mean': df['token_price'].mean(),
-                'std': df['token_price'].std(),
-                'min': df['token_price'].min(),
-                'max': df['token_price'].max(),
-                'current': df['token_price'].iloc[-1]
+        stats = {}
+        for k, col in enumerate(PRICE_COLUMNS):
+            mean, mean_sq, low, high = summary[1 + 4 * k:5 + 4 * k]
+            if data_points > 1:
+                # Sample standard deviation, matching pandas' default ddof=1
+                std = math.sqrt(max(mean_sq - mean * mean, 0.0) * data_points / (data_points - 1))
+            else:
+                std = float('nan')
+            stats[col] = {
+                'mean': mean,
+                'std': std,
+                'min': low,
+                'max': high,
+                'current': current[k]
             }
-        }
-        
+            
         # Calculate correlations
-        correlations = {
-            'energy_hash': df['energy_price'].corr(df['hash_price']),
-            'energy_token': df['energy_price'].corr(df['token_price']),
-            'hash_token': df['hash_price'].corr(df['token_price'])
-        }
+        correlations = None
+        if with_correlations:
+            if data_points > 1:
+                # All pairwise correlations in one pass; a constant series yields NaN, as before
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    corr = np.corrcoef(prices.T)
+            else:
+                # np.cov warns on a single row; the correlations are undefined (NaN) either way
+                corr = np.full((len(PRICE_COLUMNS), len(PRICE_COLUMNS)), np.nan)
+            correlations = {
+                'energy_hash': float(corr[0, 1]),
+                'energy_token': float(corr[0, 2]),
+                'hash_token': float(corr[1, 2])
+            }
         
         return {
             'stats': stats,
             'correlations': correlations,
-            'data_points': len(df),
+            'data_points': data_points,
             'period_hours': hours
         }
         
     def simulate_strategy(self, strategy='optimal', hours=24):
         """Simulate a strategy over historical data"""
+        import pandas as pd
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            # Check if pricing table exists
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pricing'")
-            if not cursor.fetchone():
-                conn.close()
+            if not self._has_table('pricing'):
                 return None
             
             since = (datetime.now() - timedelta(hours=hours)).isoformat()
-            query = f"""
-                SELECT * FROM pricing 
-                WHERE collected_at >= '{since}'
-                ORDER BY collected_at
-            """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            rows = self._conn.execute(PRICING_SIMULATION_QUERY, (since,)).fetchall()
             
-            if df.empty:
+            if not rows:
                 return None
         except Exception as e:
             print(f"Error simulating strategy: {e}")
             return None
             
-        results = []
+        # Split the fixed four-column rows straight into arrays, skipping pandas type inference
+        timestamps, energy, hash_p, token_p = zip(*rows)
+        energy = np.array(energy, dtype=np.float64)
+        hash_p = np.array(hash_p, dtype=np.float64)
+        token_p = np.array(token_p, dtype=np.float64)
         
-        for _, row in df.iterrows():
-            prices = {
-                'energy_price': row['energy_price'],
-                'hash_price': row['hash_price'],
-                'token_price': row['token_price']
-            }
-            
-            if strategy == 'optimal':
-                result = self.find_optimal_allocation(prices)
-            elif strategy == 'mining_only':
-                # Allocate all power to most efficient miner
-                result = self._mining_only_strategy(prices)
-            elif strategy == 'inference_only':
-                # Allocate all power to most efficient inference
-                result = self._inference_only_strategy(prices)
-                
-            results.append({
-                'timestamp': row['timestamp'],
-                'profit': result['total_profit'],
-                'revenue': result['total_revenue'],
-                'cost': result['total_cost'],
-                'roi': result['roi_percentage']
-            })
-            
-        return pd.DataFrame(results)
+        if strategy == 'optimal':
+            # Greedy allocation for every row at once
+            profit, revenue, cost = self._simulate_optimal(energy, hash_p, token_p)
+        elif strategy == 'mining_only':
+            # Allocate all power to most efficient miner
+            profit, revenue, cost = self._simulate_single_kind(self._miner_picks, hash_p, energy)
+        elif strategy == 'inference_only':
+            # Allocate all power to most efficient inference
+            profit, revenue, cost = self._simulate_single_kind(self._inference_picks, token_p, energy)
+        else:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        roi = np.divide(profit, cost, out=np.zeros_like(profit), where=cost > 0) * 100
         
-    def _mining_only_strategy(self, prices):
-        """Strategy that only uses mining"""
-        best_miner = None
-        best_profit_per_watt = -float('inf')
+        return pd.DataFrame({
+            'timestamp': np.array(timestamps, dtype=object),
+            'profit': profit,
+            'revenue': revenue,
+            'cost': cost,
+            'roi': roi
+        })
         
-        for miner_type, specs in self.inventory['miners'].items():
-            revenue_per_watt = (specs['hashrate'] * prices['hash_price']) / specs['power']
-            profit_per_watt = revenue_per_watt - prices['energy_price']
-            
-            if profit_per_watt > best_profit_per_watt:
-                best_profit_per_watt = profit_per_watt
-                best_miner = (miner_type, specs)
-                
-        if best_miner:
-            units = self.site_power_limit // best_miner[1]['power']
-            total_power = units * best_miner[1]['power']
-            total_revenue = units * best_miner[1]['hashrate'] * prices['hash_price']
-            total_cost = total_power * prices['energy_price']
-            
-            return {
-                'total_profit': total_revenue - total_cost,
-                'total_revenue': total_revenue,
-                'total_cost': total_cost,
-                'roi_percentage': ((total_revenue - total_cost) / total_cost * 100) if total_cost > 0 else 0
-            }
-            
-        return {'total_profit': 0, 'total_revenue': 0, 'total_cost': 0, 'roi_percentage': 0}
+    def warm_up(self):
+        """Compile (or load from numba's on-disk cache) the simulation kernel ahead of the first simulation"""
+        prices = np.zeros(1)
+        self._simulate_optimal(prices, prices, prices)
         
-    def _inference_only_strategy(self, prices):
-        """Strategy that only uses inference"""
-        best_compute = None
-        best_profit_per_watt = -float('inf')
+    def _simulate_optimal(self, energy, hash_p, token_p):
+        """Vectorized find_optimal_allocation over T price rows.
         
-        for compute_type, specs in self.inventory['inference'].items():
-            revenue_per_watt = (specs['tokens'] * prices['token_price']) / specs['power']
-            profit_per_watt = revenue_per_watt - prices['energy_price']
-            
-            if profit_per_watt > best_profit_per_watt:
-                best_profit_per_watt = profit_per_watt
-                best_compute = (compute_type, specs)
-                
-        if best_compute:
-            units = self.site_power_limit // best_compute[1]['power']
-            total_power = units * best_compute[1]['power']
-            total_revenue = units * best_compute[1]['tokens'] * prices['token_price']
-            total_cost = total_power * prices['energy_price']
-            
-            return {
-                'total_profit': total_revenue - total_cost,
-                'total_revenue': total_revenue,
-                'total_cost': total_cost,
-                'roi_percentage': ((total_revenue - total_cost) / total_cost * 100) if total_cost > 0 else 0
-            }
-            
-        return {'total_profit': 0, 'total_revenue': 0, 'total_cost': 0, 'roi_percentage': 0}
-
+        Returns (profit, revenue, cost) arrays of length T. Machine-level
+        arrays are laid out machines x times, and the greedy fill is
+        unrolled over the (few) machine types while staying vectorized over T.
+        Uses the compiled kernel instead when numba is available.
+        """
+        kernel = _get_simulate_kernel()
+        if kernel is not None:
+            return kernel(self._powers, self._rev_coeff, self._kinds, energy, hash_p, token_p,
+                                    self.site_power_limit)
+            
+        unit_price = np.where(self._kinds[:, None] == 0, hash_p, token_p)
+        revenue_per_watt = self._rev_coeff[:, None] * unit_price
+        profit_per_watt = revenue_per_watt - energy
+        order = np.argsort(-profit_per_watt, axis=0, kind='stable')
+        
+        cols = np.arange(len(energy))
+        remaining = np.full(len(energy), self.site_power_limit, dtype=np.int64)
+        profit = np.zeros(len(energy))
+        revenue = np.zeros(len(energy))
+        cost = np.zeros(len(energy))
+        
+        for rank in range(len(self._powers)):
+            idx = order[rank]
+            ppw = profit_per_watt[idx, cols]
+            units = np.where(ppw > 0, remaining // self._powers[idx], 0)
+            power_used = units * self._powers[idx]
+            
+            remaining -= power_used
+            profit += power_used * ppw
+            revenue += power_used * revenue_per_watt[idx, cols]
+            cost += power_used * energy
+            
+        return profit, revenue, cost
+        
+    def _simulate_single_kind(self, picks, unit_price, energy):
+        """Single-kind strategy over T price rows, returning (profit, revenue, cost) arrays"""
+        if picks is None:
+            return np.zeros(len(energy)), np.zeros(len(energy)), np.zeros(len(energy))
+            
+        best = picks[np.where(unit_price > 0, 2, np.where(unit_price < 0, 0, 1))]
+        # site_power_limit may be changed after construction, so read it live
+        units = self.site_power_limit // self._powers[best]
+        revenue = units * self._caps[best] * unit_price
+        cost = units * self._powers[best] * energy
+        return revenue - cost, revenue, cost
 
 if __name__ == "__main__":
     analyzer = ArbitrageAnalyzer()
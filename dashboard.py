@@ -8,10 +8,15 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+from plotly_resampler import FigureResampler
+from plotly_resampler.aggregation import MinMaxLTTB
 import sqlite3
 from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import orjson
 import os
 from dotenv import load_dotenv
 from arbitrage_analyzer import ArbitrageAnalyzer
@@ -27,66 +32,228 @@ st.set_page_config(
 API_BASE_URL = os.getenv('API_BASE_URL', 'https://mara-hackathon-api.onrender.com')
 API_KEY = os.getenv('API_KEY')
 
+# (connect, read) timeout for API calls
+REQUEST_TIMEOUT = (3, 10)
+
+# Ranges wider than this are charted from the hourly OHLC rollup instead of raw rows
+HOURLY_MIN_HOURS = 6
+
+# Rows per chunk when streaming query results into pandas
+SQL_CHUNK_ROWS = 5000
+
+# pricing_stats rows older than about one collection interval (5 min) describe a stale window
+STATS_MAX_AGE = timedelta(minutes=6)
+
+# Allocation name prefix -> field in the /machines API payload
+_API_KEY_OF = {
+    'air_miner': 'air_miners',
+    'hydro_miner': 'hydro_miners',
+    'immersion_miner': 'immersion_miners',
+    'gpu_inference': 'gpu_compute',
+    'asic_inference': 'asic_compute'
+}
+
+# Points kept per raw price series (about 2x the chart's width in pixels)
+CHART_MAX_POINTS = 2000
+
+# Price series shown on the market chart: name and line color
+PRICE_SERIES = {
+    'energy': ('Energy Price', 'red'),
+    'hash': ('Hash Price', 'orange'),
+    'token': ('Token Price', 'blue')
+}
+
 @st.cache_resource
 def get_analyzer():
-    return ArbitrageAnalyzer()
+    analyzer = ArbitrageAnalyzer()
+    # Pay the JIT cost once per process rather than on the first rerun that simulates
+    analyzer.warm_up()
+    return analyzer
 
-def load_pricing_data(hours=24):
+@st.cache_resource
+def get_session():
+    """Keep-alive API session shared across reruns so TLS connections are reused"""
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+    if API_KEY:
+        session.headers.update({'X-Api-Key': API_KEY})
+    return session
+
+def _json(response):
+    """Parse a JSON response body with orjson (faster than response.json())"""
+    return orjson.loads(response.content)
+
+def latest_row_key(table, column):
+    """Newest value of column in table, or None if the table doesn't exist yet.
+    
+    Passed as cache_key to the cached loaders so their cache is invalidated
+    exactly when the collector writes a new row.
+    """
+    conn = sqlite3.connect('mara_data.db')
+    try:
+        return conn.execute(f"SELECT MAX({column}) FROM {table}").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def read_sql_chunked(query, conn, params, parse_dates, float32_cols=()):
+    """Read a query in chunks, downcasting float32_cols chunk by chunk to bound peak memory"""
+    chunks = [
+        chunk.astype({col: 'float32' for col in float32_cols})
+        for chunk in pd.read_sql_query(query, conn, params=params, parse_dates=parse_dates,
+                                       chunksize=SQL_CHUNK_ROWS)
+    ]
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_pricing_data(hours=24, cache_key=None):
     """Load pricing data from database"""
     try:
         conn = sqlite3.connect('mara_data.db')
         
-        # Check if pricing table exists
+        # Check which pricing tables exist
         cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='pricing'")
-        if not cursor.fetchone():
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('pricing', 'pricing_hourly')")
+        tables = {row[0] for row in cursor.fetchall()}
+        if 'pricing' not in tables:
             conn.close()
             return pd.DataFrame()  # Return empty dataframe
         
         since = (datetime.now() - timedelta(hours=hours)).isoformat()
+        
+        # Wide ranges read the hourly OHLC rollup maintained by the collector
+        if hours > HOURLY_MIN_HOURS and 'pricing_hourly' in tables:
+            # Only the candle columns are charted
+            hourly_cols = [f'{price}_{stat}' for price in PRICE_SERIES
+                           for stat in ('open', 'high', 'low', 'close')]
+            query = f"""
+                SELECT hour, {', '.join(hourly_cols)} FROM pricing_hourly 
+                WHERE hour >= ?
+                ORDER BY hour
+            """
+            df = read_sql_chunked(query, conn, (since[:13] + ':00:00',), ['hour'], hourly_cols)
+            if not df.empty:
+                conn.close()
+                # Expose the hourly close under the raw column names used elsewhere
+                df['collected_at'] = df['hour']
+                for price in PRICE_SERIES:
+                    df[f'{price}_price'] = df[f'{price}_close']
+                return df
+        
+        price_cols = [f'{price}_price' for price in PRICE_SERIES]
         query = f"""
-            SELECT * FROM pricing 
-            WHERE collected_at >= '{since}'
+            SELECT collected_at, {', '.join(price_cols)} FROM pricing 
+            WHERE collected_at >= ?
             ORDER BY collected_at
         """
-        df = pd.read_sql_query(query, conn)
+        df = read_sql_chunked(query, conn, (since,), ['collected_at'], price_cols)
         conn.close()
         return df
     except Exception as e:
         print(f"Error loading pricing data: {e}")
         return pd.DataFrame()  # Return empty dataframe on error
 
-def create_price_chart(df):
-    """Create interactive price chart"""
-    fig = make_subplots(
-        rows=3, cols=1,
-        shared_xaxes=True,
-        subplot_titles=('Energy Price', 'Hash Price', 'Token Price'),
-        vertical_spacing=0.1
-    )
+@st.cache_data(ttl=300, show_spinner=False)
+def load_status_data(hours=24, cache_key=None):
+    """Load site status history from database"""
+    conn = sqlite3.connect('mara_data.db')
+    query = """
+        SELECT timestamp, total_power_cost, total_revenue FROM site_status 
+        WHERE timestamp >= datetime('now', ?)
+        ORDER BY timestamp
+    """
+    # Money totals stay float64; float32 would lose cents at these magnitudes
+    status_df = read_sql_chunked(query, conn, (f'-{hours} hours',), ['timestamp'])
+    conn.close()
+    return status_df
+
+def load_window_stats(hours):
+    """Trends for hours precomputed by the collector in pricing_stats, or None if there is no fresh row"""
+    conn = sqlite3.connect('mara_data.db')
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute("SELECT * FROM pricing_stats WHERE window_hours = ?", (hours,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    if row is None:
+        return None
     
-    # Energy price
-    fig.add_trace(
-        go.Scatter(x=df['collected_at'], y=df['energy_price'], 
-                  mode='lines', name='Energy Price', line=dict(color='red')),
-        row=1, col=1
-    )
+    # The window ends at the collector's last tick; once it stops, fall back to a window ending now
+    if datetime.fromisoformat(row['updated_at']) < datetime.now() - STATS_MAX_AGE:
+        return None
     
-    # Hash price
-    fig.add_trace(
-        go.Scatter(x=df['collected_at'], y=df['hash_price'], 
-                  mode='lines', name='Hash Price', line=dict(color='orange')),
-        row=2, col=1
+    # Same shape as analyzer.analyze_price_trends
+    return {
+        'stats': {
+            f'{price}_price': {stat: row[f'{price}_{stat}'] for stat in ('mean', 'std', 'min', 'max', 'current')}
+            for price in PRICE_SERIES
+        },
+        'correlations': {
+            f'{a}_{b}': row[f'corr_{a}_{b}']
+            for a, b in (('energy', 'hash'), ('energy', 'token'), ('hash', 'token'))
+        },
+        'data_points': row['data_points'],
+        'period_hours': hours
+    }
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_price_trends(_analyzer, hours=24, cache_key=None):
+    """Price trends from pricing_stats when the window is precomputed, else from the analyzer"""
+    trends = load_window_stats(hours)
+    if trends is None:
+        trends = _analyzer.analyze_price_trends(hours)
+    return trends
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_optimal_allocation(_analyzer, cache_key=None):
+    """Cached analyzer.find_optimal_allocation, recomputed once per new pricing row"""
+    return _analyzer.find_optimal_allocation()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_strategy_simulation(_analyzer, strategy, hours=24, cache_key=None):
+    """Cached analyzer.simulate_strategy, recomputed once per new pricing row"""
+    return _analyzer.simulate_strategy(strategy, hours=hours)
+
+def create_price_chart(df):
+    """Create interactive price chart"""
+    # FigureResampler only ships a downsampled view of each series to the browser;
+    # MinMaxLTTB keeps the extremes so spikes survive the downsampling
+    fig = FigureResampler(
+        make_subplots(
+            rows=3, cols=1,
+            shared_xaxes=True,
+            subplot_titles=('Energy Price', 'Hash Price', 'Token Price'),
+            vertical_spacing=0.1
+        ),
+        default_n_shown_samples=CHART_MAX_POINTS,
+        default_downsampler=MinMaxLTTB(minmax_ratio=4)
     )
+    collected_at = df['collected_at'].to_numpy()
+    hourly = 'energy_open' in df.columns
     
-    # Token price
-    fig.add_trace(
-        go.Scatter(x=df['collected_at'], y=df['token_price'], 
-                  mode='lines', name='Token Price', line=dict(color='blue')),
-        row=3, col=1
-    )
+    for row, (price, (name, color)) in enumerate(PRICE_SERIES.items(), start=1):
+        if hourly:
+            # Hourly rollup: one candle per hour
+            fig.add_trace(
+                go.Candlestick(x=collected_at, open=df[f'{price}_open'], high=df[f'{price}_high'],
+                               low=df[f'{price}_low'], close=df[f'{price}_close'], name=name),
+                row=row, col=1
+            )
+        else:
+            fig.add_trace(
+                go.Scattergl(mode='lines', name=name, line=dict(color=color)),
+                hf_x=collected_at, hf_y=df[f'{price}_price'].to_numpy(),
+                row=row, col=1
+            )
     
-    fig.update_layout(height=800, showlegend=False)
+    # A constant uirevision keeps the user's zoom/pan when the chart is redrawn on rerun
+    fig.update_layout(height=800, showlegend=False, uirevision='prices')
+    fig.update_xaxes(rangeslider_visible=False)
     fig.update_xaxes(title_text="Time", row=3, col=1)
     fig.update_yaxes(title_text="$/unit", row=1, col=1)
     fig.update_yaxes(title_text="$/hash", row=2, col=1)
@@ -94,13 +261,13 @@ def create_price_chart(df):
     
     return fig
 
-def create_profit_comparison(analyzer):
+def create_profit_comparison(analyzer, cache_key=None):
     """Create profit comparison chart for different strategies"""
     strategies = ['optimal', 'mining_only', 'inference_only']
     profits = []
     
     for strategy in strategies:
-        sim_results = analyzer.simulate_strategy(strategy, hours=24)
+        sim_results = load_strategy_simulation(analyzer, strategy, hours=24, cache_key=cache_key)
         if sim_results is not None and not sim_results.empty:
             profits.append({
                 'Strategy': strategy.replace('_', ' ').title(),
@@ -117,10 +284,8 @@ def create_profit_comparison(analyzer):
         return fig
     return None
 
-def display_current_allocation(analyzer):
+def display_current_allocation(optimal):
     """Display current optimal allocation"""
-    optimal = analyzer.find_optimal_allocation()
-    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -135,18 +300,28 @@ def display_current_allocation(analyzer):
     
     # Allocation breakdown
     if optimal['allocation']:
-        allocation_df = []
+        names, units, powers, revenues, costs, profits = [], [], [], [], [], []
         for name, details in optimal['allocation'].items():
-            allocation_df.append({
-                'Machine': name.replace('_', ' ').title(),
-                'Units': details['units'],
-                'Power (W)': details['power_used'],
-                'Revenue': f"${details['revenue']:,.2f}",
-                'Cost': f"${details['cost']:,.2f}",
-                'Profit': f"${details['profit']:,.2f}"
-            })
+            names.append(name.replace('_', ' ').title())
+            units.append(details['units'])
+            powers.append(details['power_used'])
+            revenues.append(details['revenue'])
+            costs.append(details['cost'])
+            profits.append(details['profit'])
+        
+        allocation_df = pd.DataFrame({
+            'Machine': names,
+            'Units': units,
+            'Power (W)': powers,
+            'Revenue': revenues,
+            'Cost': costs,
+            'Profit': profits
+        })
         
-        st.dataframe(pd.DataFrame(allocation_df), use_container_width=True)
+        # Money columns stay numeric; Streamlit formats them in the browser
+        money = st.column_config.NumberColumn(format='$%.2f')
+        st.dataframe(allocation_df, column_config={'Revenue': money, 'Cost': money, 'Profit': money},
+                     use_container_width=True)
 
 def create_site_interface():
     """Interface for creating and managing sites"""
@@ -158,30 +333,28 @@ def create_site_interface():
             submit = st.form_submit_button("Create Site")
             
             if submit and site_name:
-                response = requests.post(
+                response = get_session().post(
                     f"{API_BASE_URL}/sites",
-                    json={"name": site_name}
+                    json={"name": site_name},
+                    timeout=REQUEST_TIMEOUT
                 )
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = _json(response)
                     st.success(f"Site created! API Key: {data['api_key']}")
                     st.info("Please save this API key in your .env file as API_KEY")
                 else:
                     st.error(f"Error creating site: {response.text}")
     else:
         # Show current site info
-        headers = {'X-Api-Key': API_KEY}
-        response = requests.get(f"{API_BASE_URL}/sites", headers=headers)
+        response = get_session().get(f"{API_BASE_URL}/sites", timeout=REQUEST_TIMEOUT)
         
         if response.status_code == 200:
-            site_data = response.json()
+            site_data = _json(response)
             st.info(f"Current Site: {site_data.get('name', 'Unknown')} | Power Limit: {site_data.get('power', 0):,} W")
 
 def apply_allocation(analyzer, allocation):
     """Apply the suggested allocation to the API"""
-    headers = {'X-Api-Key': API_KEY}
-    
     # Convert allocation to API format
     api_allocation = {
         'air_miners': 0,
@@ -192,21 +365,15 @@ def apply_allocation(analyzer, allocation):
     }
     
     for name, details in allocation.items():
-        if 'air_miner' in name:
-            api_allocation['air_miners'] = details['units']
-        elif 'hydro_miner' in name:
-            api_allocation['hydro_miners'] = details['units']
-        elif 'immersion_miner' in name:
-            api_allocation['immersion_miners'] = details['units']
-        elif 'gpu_inference' in name:
-            api_allocation['gpu_compute'] = details['units']
-        elif 'asic_inference' in name:
-            api_allocation['asic_compute'] = details['units']
+        for prefix, api_key in _API_KEY_OF.items():
+            if name.startswith(prefix):
+                api_allocation[api_key] = details['units']
+                break
     
-    response = requests.put(
+    response = get_session().put(
         f"{API_BASE_URL}/machines",
-        headers=headers,
-        json=api_allocation
+        json=api_allocation,
+        timeout=REQUEST_TIMEOUT
     )
     
     return response
@@ -217,6 +384,9 @@ def main():
     
     analyzer = get_analyzer()
     
+    # Newest pricing row; cached loaders recompute only when this changes
+    pricing_key = latest_row_key('pricing', 'collected_at')
+    
     # Sidebar
     with st.sidebar:
         st.header("Settings")
@@ -233,31 +403,25 @@ def main():
         st.header("Market Prices")
         
         # Load and display price data
-        df = load_pricing_data(time_range)
+        df = load_pricing_data(time_range, cache_key=pricing_key)
         
         if not df.empty:
-            # Current prices
-            latest = df.iloc[-1]
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                delta = ((latest['energy_price'] - df.iloc[0]['energy_price']) / df.iloc[0]['energy_price'] * 100)
-                st.metric("Energy Price", f"${latest['energy_price']:.4f}", f"{delta:.2f}%")
-            
-            with col2:
-                delta = ((latest['hash_price'] - df.iloc[0]['hash_price']) / df.iloc[0]['hash_price'] * 100)
-                st.metric("Hash Price", f"${latest['hash_price']:.4f}", f"{delta:.2f}%")
+            # Current prices and change over the range, computed for all series at once
+            price_cols = [f'{price}_price' for price in PRICE_SERIES]
+            first = df[price_cols].iloc[0].to_numpy()
+            latest = df[price_cols].iloc[-1].to_numpy()
+            deltas = (latest - first) / first * 100.0
             
-            with col3:
-                delta = ((latest['token_price'] - df.iloc[0]['token_price']) / df.iloc[0]['token_price'] * 100)
-                st.metric("Token Price", f"${latest['token_price']:.4f}", f"{delta:.2f}%")
+            for col, (name, _), price, delta in zip(st.columns(3), PRICE_SERIES.values(), latest, deltas):
+                with col:
+                    st.metric(name, f"${price:.4f}", f"{delta:.2f}%")
             
             # Price chart
             st.plotly_chart(create_price_chart(df), use_container_width=True)
             
             # Price statistics
             st.subheader("Price Statistics")
-            trends = analyzer.analyze_price_trends(time_range)
+            trends = load_price_trends(analyzer, time_range, cache_key=pricing_key)
             if trends:
                 stats_df = pd.DataFrame(trends['stats']).T
                 st.dataframe(stats_df.round(4), use_container_width=True)
@@ -272,25 +436,32 @@ def main():
     with tab2:
         st.header("Arbitrage Opportunities")
         
+        # Compute the optimal allocation once per pricing row; the display and Apply share it.
+        # Without a pricing table there is no row to key on, so recompute every rerun.
+        if (pricing_key is None or 'optimal' not in st.session_state
+                or st.session_state.get('optimal_key') != pricing_key):
+            st.session_state.optimal = load_optimal_allocation(analyzer, cache_key=pricing_key)
+            st.session_state.optimal_key = pricing_key
+        optimal = st.session_state.optimal
+        
         # Current optimal allocation
         st.subheader("Current Optimal Allocation")
-        display_current_allocation(analyzer)
+        display_current_allocation(optimal)
         
         # Apply allocation button
         if API_KEY:
             if st.button("Apply Optimal Allocation", type="primary"):
-                optimal = analyzer.find_optimal_allocation()
                 response = apply_allocation(analyzer, optimal['allocation'])
                 
                 if response.status_code == 200:
                     st.success("Allocation applied successfully!")
-                    st.json(response.json())
+                    st.json(_json(response))
                 else:
                     st.error(f"Error applying allocation: {response.text}")
         
         # Strategy comparison
         st.subheader("Strategy Comparison")
-        comparison_fig = create_profit_comparison(analyzer)
+        comparison_fig = create_profit_comparison(analyzer, cache_key=pricing_key)
         if comparison_fig:
             st.plotly_chart(comparison_fig, use_container_width=True)
     
@@ -301,11 +472,10 @@ def main():
             st.subheader("Current Allocation")
             
             # Fetch current allocation
-            headers = {'X-Api-Key': API_KEY}
-            response = requests.get(f"{API_BASE_URL}/machines", headers=headers)
+            response = get_session().get(f"{API_BASE_URL}/machines", timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
-                current = response.json()
+                current = _json(response)
                 
                 col1, col2 = st.columns(2)
                 
@@ -328,22 +498,15 @@ def main():
                     'ASIC Compute': current.get('asic_compute', 0)
                 }
                 
-                fig = px.bar(x=list(allocation_data.keys()), y=list(allocation_data.values()),
-                            title="Current Machine Allocation")
+                fig = go.Figure(go.Bar(x=list(allocation_data), y=list(allocation_data.values())))
+                fig.update_layout(title="Current Machine Allocation")
                 st.plotly_chart(fig, use_container_width=True)
     
     with tab4:
         st.header("Performance Metrics")
         
         # Load site status history
-        conn = sqlite3.connect('mara_data.db')
-        query = f"""
-            SELECT * FROM site_status 
-            WHERE timestamp >= datetime('now', '-{time_range} hours')
-            ORDER BY timestamp
-        """
-        status_df = pd.read_sql_query(query, conn)
-        conn.close()
+        status_df = load_status_data(time_range, cache_key=latest_row_key('site_status', 'timestamp'))
         
         if not status_df.empty:
             # Profit over time
@@ -4,11 +4,18 @@ Collects pricing data every 5 minutes and stores it in a SQLite database
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sqlite3
 import json
+import orjson
 import time
-import schedule
-from datetime import datetime
+import statistics
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import groupby
 import os
 from dotenv import load_dotenv
 
@@ -17,28 +24,123 @@ load_dotenv()
 API_BASE_URL = os.getenv('API_BASE_URL', 'https://mara-hackathon-api.onrender.com')
 API_KEY = os.getenv('API_KEY')
 
+# (connect, read) timeout for API calls
+REQUEST_TIMEOUT = (3, 10)
+
+# Shared keep-alive session so each collection tick reuses the TLS connection
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+if API_KEY:
+    SESSION.headers.update({'X-Api-Key': API_KEY})
+
+# Per-hour OHLC rollup of the pricing table, so wide dashboard ranges don't rescan raw rows
+HOURLY_PRICES = ('energy', 'hash', 'token')
+HOURLY_STATS = ('open', 'high', 'low', 'close', 'avg', 'std')
+HOURLY_COLUMNS = [f'{price}_{stat}' for price in HOURLY_PRICES for stat in HOURLY_STATS]
+
+# Rolling windows (hours) precomputed into pricing_stats for the dashboard's trend tables
+STATS_WINDOWS = (1, 6, 24, 48)
+STATS_FIELDS = ('mean', 'std', 'min', 'max', 'current')
+STATS_COLUMNS = [f'{price}_{stat}' for price in HOURLY_PRICES for stat in STATS_FIELDS]
+STATS_PAIRS = (('energy', 'hash'), ('energy', 'token'), ('hash', 'token'))
+STATS_CORR_COLUMNS = [f'corr_{a}_{b}' for a, b in STATS_PAIRS]
+
+# Seconds between collection ticks
+COLLECTION_INTERVAL = 300
+
+# Raw pricing rows older than this are pruned once a day (288 ticks); pricing_hourly keeps the history
+RETENTION_DAYS = 30
+RETENTION_EVERY_TICKS = 288
+
+def _json(response):
+    """Parse a JSON response body with orjson (faster than response.json())"""
+    return orjson.loads(response.content)
+
+def _correlation(xs, ys):
+    """Pearson correlation of two equal-length series, or None for fewer than two points or a constant series"""
+    if len(xs) < 2:
+        return None
+    mean_x = statistics.fmean(xs)
+    mean_y = statistics.fmean(ys)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    if sxx == 0 or syy == 0:
+        return None
+    return sxy / (sxx * syy) ** 0.5
+
 class DataCollector:
     def __init__(self, db_path='mara_data.db'):
         self.db_path = db_path
+        # One connection for the collector's lifetime instead of reopening it on every write
+        self.conn = self._connect()
+        self.ticks = 0
         self.init_database()
         
+    def _connect(self):
+        """Open a database connection tuned for frequent small writes"""
+        # Autocommit mode: transactions are opened explicitly by _transaction
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        # WAL lets the dashboard read while the collector writes (persists in the db file)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL is still crash-safe and skips the fsync on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+        
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed writes as a single transaction on the shared connection"""
+        cursor = self.conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            yield cursor
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+        
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+        
     def init_database(self):
         """Initialize SQLite database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create pricing table
+        # Incremental auto-vacuum lets the retention job return freed pages;
+        # a database created without it only switches after a full VACUUM
+        if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            self.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.conn.execute('VACUUM')
+            
+        with self._transaction() as cursor:
+            self._create_tables(cursor)
+            
+    def _create_tables(self, cursor):
+        """Create tables, rollups and indexes that don't exist yet"""
+        # Older databases keyed pricing on an autoincrement id; move them to the new layout
+        migrate = 'id' in [row[1] for row in cursor.execute('PRAGMA table_info(pricing)')]
+        if migrate:
+            cursor.execute('ALTER TABLE pricing RENAME TO pricing_old')
+            
+        # Create pricing table, clustered on collected_at so range scans walk the primary key
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS pricing (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collected_at TEXT PRIMARY KEY,
                 timestamp TEXT,
                 energy_price REAL,
                 hash_price REAL,
-                token_price REAL,
-                collected_at TEXT
-            )
+                token_price REAL
+            ) WITHOUT ROWID
         ''')
         
+        if migrate:
+            cursor.execute('''
+                INSERT OR IGNORE INTO pricing (collected_at, timestamp, energy_price, hash_price, token_price)
+                SELECT collected_at, timestamp, energy_price, hash_price, token_price
+                FROM pricing_old
+                WHERE collected_at IS NOT NULL
+            ''')
+            cursor.execute('DROP TABLE pricing_old')
+        
         # Create inventory table (static data)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS inventory (
@@ -64,15 +166,39 @@ class DataCollector:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Create hourly pricing rollup (refreshed by _insert_prices on every price insert)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS pricing_hourly (
+                hour TEXT PRIMARY KEY,
+                samples INTEGER,
+                {', '.join(f'{column} REAL' for column in HOURLY_COLUMNS)}
+            )
+        ''')
+        
+        # Backfill the rollup from existing history the first time
+        if not cursor.execute('SELECT 1 FROM pricing_hourly LIMIT 1').fetchone():
+            self.update_hourly(cursor)
+        
+        # Create rolling-window statistics (refreshed by _insert_prices on every price insert)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS pricing_stats (
+                window_hours INTEGER PRIMARY KEY,
+                data_points INTEGER,
+                {', '.join(f'{column} REAL' for column in STATS_COLUMNS + STATS_CORR_COLUMNS)},
+                updated_at TEXT
+            )
+        ''')
+        self.update_stats(cursor)
+        
+        # Range queries filter on this column (pricing is already keyed on collected_at)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_site_status_timestamp ON site_status(timestamp)")
         
     def fetch_prices(self):
         """Fetch current pricing data"""
         try:
-            response = requests.get(f"{API_BASE_URL}/prices")
+            response = SESSION.get(f"{API_BASE_URL}/prices", timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
             else:
                 print(f"Error fetching prices: {response.status_code}")
                 return None
@@ -83,9 +209,9 @@ class DataCollector:
     def fetch_inventory(self):
         """Fetch inventory data (static, only needs to be called once)"""
         try:
-            response = requests.get(f"{API_BASE_URL}/inventory")
+            response = SESSION.get(f"{API_BASE_URL}/inventory", timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
             else:
                 print(f"Error fetching inventory: {response.status_code}")
                 return None
@@ -100,10 +226,9 @@ class DataCollector:
             return None
             
         try:
-            headers = {'X-Api-Key': API_KEY}
-            response = requests.get(f"{API_BASE_URL}/machines", headers=headers)
+            response = SESSION.get(f"{API_BASE_URL}/machines", timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
             else:
                 print(f"Error fetching site status: {response.status_code}")
                 return None
@@ -113,11 +238,10 @@ class DataCollector:
             
     def store_prices(self, prices):
         """Store pricing data in database"""
-        if not prices:
-            return
-            
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.store_tick(prices=prices)
+        
+    def _insert_prices(self, cursor, prices):
+        """Insert the most recent price point and refresh its hourly bucket"""
         collected_at = datetime.now().isoformat()
         
         # Store only the most recent price point
@@ -134,47 +258,113 @@ class DataCollector:
                 collected_at
             ))
             
-        conn.commit()
-        conn.close()
-        print(f"Stored pricing data at {collected_at}")
+            # Refresh the rollup bucket for the current hour
+            self.update_hourly(cursor, since=collected_at[:13] + ':00:00')
+            self.update_stats(cursor)
+            
+        return collected_at
+        
+    def update_hourly(self, cursor, since=None):
+        """Recompute pricing_hourly buckets from pricing rows collected at or after since (all rows if None)"""
+        query = 'SELECT collected_at, energy_price, hash_price, token_price FROM pricing'
+        params = ()
+        if since is not None:
+            query += ' WHERE collected_at >= ?'
+            params = (since,)
+        rows = cursor.execute(query + ' ORDER BY collected_at', params).fetchall()
+        
+        buckets = []
+        for hour, group in groupby(rows, key=lambda row: row[0][:13]):
+            group = list(group)
+            values = []
+            for k in range(1, len(HOURLY_PRICES) + 1):
+                series = [row[k] for row in group]
+                values += [
+                    series[0],
+                    max(series),
+                    min(series),
+                    series[-1],
+                    statistics.fmean(series),
+                    statistics.stdev(series) if len(series) > 1 else None
+                ]
+            buckets.append((hour + ':00:00', len(group), *values))
+            
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO pricing_hourly (hour, samples, {', '.join(HOURLY_COLUMNS)})
+            VALUES ({', '.join('?' * (len(HOURLY_COLUMNS) + 2))})
+        ''', buckets)
+        
+    def update_stats(self, cursor):
+        """Recompute pricing_stats for every window in STATS_WINDOWS, ending now"""
+        now = datetime.now()
+        since = (now - timedelta(hours=max(STATS_WINDOWS))).isoformat()
+        rows = cursor.execute('''
+            SELECT collected_at, energy_price, hash_price, token_price FROM pricing
+            WHERE collected_at >= ?
+            ORDER BY collected_at
+        ''', (since,)).fetchall()
+        collected = [row[0] for row in rows]
+        
+        windows = []
+        for hours in STATS_WINDOWS:
+            # Rows are sorted, so each window is a suffix of the widest one
+            window = rows[bisect_left(collected, (now - timedelta(hours=hours)).isoformat()):]
+            if not window:
+                cursor.execute('DELETE FROM pricing_stats WHERE window_hours = ?', (hours,))
+                continue
+            
+            series = {price: [row[k] for row in window] for k, price in enumerate(HOURLY_PRICES, start=1)}
+            values = []
+            for price in HOURLY_PRICES:
+                values += [
+                    statistics.fmean(series[price]),
+                    statistics.stdev(series[price]) if len(window) > 1 else None,
+                    min(series[price]),
+                    max(series[price]),
+                    series[price][-1]
+                ]
+            for a, b in STATS_PAIRS:
+                values.append(_correlation(series[a], series[b]))
+            windows.append((hours, len(window), *values, now.isoformat()))
+            
+        columns = ['window_hours', 'data_points'] + STATS_COLUMNS + STATS_CORR_COLUMNS + ['updated_at']
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO pricing_stats ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', windows)
         
     def store_inventory(self, inventory):
         """Store inventory data (only needs to be done once)"""
         if not inventory:
             return
             
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         collected_at = datetime.now().isoformat()
         
-        # Clear existing inventory data
-        cursor.execute('DELETE FROM inventory')
+        # Miners report hashrate, inference compute reports tokens
+        rows = [
+            ('miner', miner_type, specs['power'], specs['hashrate'], collected_at)
+            for miner_type, specs in inventory.get('miners', {}).items()
+        ] + [
+            ('inference', compute_type, specs['power'], specs['tokens'], collected_at)
+            for compute_type, specs in inventory.get('inference', {}).items()
+        ]
         
-        # Store miners
-        for miner_type, specs in inventory.get('miners', {}).items():
-            cursor.execute('''
-                INSERT INTO inventory (type, subtype, power, capability, collected_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', ('miner', miner_type, specs['power'], specs['hashrate'], collected_at))
-            
-        # Store inference compute
-        for compute_type, specs in inventory.get('inference', {}).items():
-            cursor.execute('''
+        # Replace existing inventory data in one transaction
+        with self._transaction() as cursor:
+            cursor.execute('DELETE FROM inventory')
+            cursor.executemany('''
                 INSERT INTO inventory (type, subtype, power, capability, collected_at)
                 VALUES (?, ?, ?, ?, ?)
-            ''', ('inference', compute_type, specs['power'], specs['tokens'], collected_at))
+            ''', rows)
             
-        conn.commit()
-        conn.close()
         print(f"Stored inventory data at {collected_at}")
         
     def store_site_status(self, status):
         """Store site status data"""
-        if not status:
-            return
-            
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.store_tick(status=status)
+        
+    def _insert_site_status(self, cursor, status):
+        """Insert one site status snapshot"""
         timestamp = datetime.now().isoformat()
         
         # Extract allocation data
@@ -199,41 +389,70 @@ class DataCollector:
             json.dumps(status.get('revenue', {}))
         ))
         
-        conn.commit()
-        conn.close()
-        print(f"Stored site status at {timestamp}")
+        return timestamp
         
     def collect_data(self):
         """Main data collection function"""
         print("\nCollecting data...")
         
-        # Fetch and store prices
-        prices = self.fetch_prices()
-        self.store_prices(prices)
+        # Fetch prices, and site status if API key is available, concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            prices_future = executor.submit(self.fetch_prices)
+            status_future = executor.submit(self.fetch_site_status) if API_KEY else None
+            prices = prices_future.result()
+            status = status_future.result() if status_future else None
+        
+        self.store_tick(prices, status)
         
-        # Fetch and store site status if API key is available
-        if API_KEY:
-            status = self.fetch_site_status()
-            self.store_site_status(status)
+        self.ticks += 1
+        if self.ticks % RETENTION_EVERY_TICKS == 0:
+            self.prune_history()
+            
+    def store_tick(self, prices=None, status=None):
+        """Store prices and/or site status in one transaction, so a tick costs a single commit"""
+        if not prices and not status:
+            return
+            
+        with self._transaction() as cursor:
+            collected_at = self._insert_prices(cursor, prices) if prices else None
+            timestamp = self._insert_site_status(cursor, status) if status else None
+            
+        if collected_at:
+            print(f"Stored pricing data at {collected_at}")
+        if timestamp:
+            print(f"Stored site status at {timestamp}")
+            
+    def prune_history(self):
+        """Delete raw pricing rows older than RETENTION_DAYS and release their pages"""
+        cutoff = (datetime.now() - timedelta(days=RETENTION_DAYS)).isoformat()
+        with self._transaction() as cursor:
+            cursor.execute('DELETE FROM pricing WHERE collected_at < ?', (cutoff,))
+            deleted = cursor.rowcount
             
+        # The pragma frees one page per step; executescript steps it to completion
+        self.conn.executescript('PRAGMA incremental_vacuum(1000);')
+        print(f"Pruned {deleted} pricing rows older than {cutoff}")
+        
     def run_continuous(self):
         """Run data collection continuously every 5 minutes"""
-        # Collect inventory once at startup
-        inventory = self.fetch_inventory()
-        self.store_inventory(inventory)
-        
-        # Initial collection
-        self.collect_data()
-        
-        # Schedule collection every 5 minutes
-        schedule.every(5).minutes.do(self.collect_data)
+        # Collect inventory once at startup, fetched alongside the initial collection
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            inventory_future = executor.submit(self.fetch_inventory)
+            self.collect_data()
+            self.store_inventory(inventory_future.result())
         
         print("Data collector started. Collecting data every 5 minutes...")
         print("Press Ctrl+C to stop")
         
+        # Sleep straight to the next deadline instead of polling every second
         while True:
-            schedule.run_pending()
-            time.sleep(1)
+            next_deadline = time.monotonic() + COLLECTION_INTERVAL
+            while True:
+                remaining = next_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(remaining)
+            self.collect_data()
 
 if __name__ == "__main__":
     collector = DataCollector()
@@ -242,4 +461,6 @@ if __name__ == "__main__":
     try:
         collector.run_continuous()
     except KeyboardInterrupt:
-        print("\nData collection stopped.") 
\ No newline at end of file
+        print("\nData collection stopped.")
+    finally:
+        collector.close() 
\ No newline at end of file